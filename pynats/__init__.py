@@ -1,3 +1,4 @@
+from .aio import AsyncNATSClient
 from .client import NATSClient, NATSMessage, NATSSubscription
 from .exceptions import (
     NATSConnectionError,
@@ -10,6 +11,7 @@ from .exceptions import (
 )
 
 __all__ = (
+    "AsyncNATSClient",
     "NATSClient",
     "NATSConnectionError",
     "NATSError",
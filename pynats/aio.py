@@ -0,0 +1,394 @@
+import asyncio
+import itertools
+import json
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from urllib.parse import urlparse
+
+from pynats.client import (
+    _CRLF_,
+    _CRLF_LEN,
+    _PING_LINE,
+    _PONG_LINE,
+    INBOX_PREFIX,
+    INFO_OP,
+    MSG_OP,
+    OK_OP,
+    PING_OP,
+    PONG_OP,
+    NATSConnOptions,
+    NATSMessage,
+    NATSSubscription,
+    _build_connect_command,
+    _build_sub_command,
+    _create_ssl_context,
+    _parse_command,
+    _ReplyCapture,
+)
+from pynats.exceptions import (
+    NATSInvalidSchemeError,
+    NATSReadSocketError,
+    NATSTCPConnectionRequiredError,
+    NATSTLSConnectionRequiredError,
+)
+from pynats.nuid import NUID
+
+__all__ = ("AsyncNATSClient",)
+
+
+class AsyncNATSClient:
+    __slots__ = (
+        "_conn_options",
+        "_connect_command",
+        "_reader",
+        "_writer",
+        "_timeout",
+        "_broken",
+        "_reading",
+        "_read_progress",
+        "_ssid",
+        "_subs",
+        "_nuid",
+        "_inbox_prefix",
+        "_inbox_seq",
+        "_tasks",
+        "_task_error",
+    )
+
+    def __init__(
+        self,
+        url: str = "nats://127.0.0.1:4222",
+        *,
+        name: str = "nats-python",
+        verbose: bool = False,
+        pedantic: bool = False,
+        tls_cacert: Optional[str] = None,
+        tls_client_cert: Optional[str] = None,
+        tls_client_key: Optional[str] = None,
+        tls_hostname: Optional[str] = None,
+        tls_verify: bool = False,
+        socket_timeout: Optional[float] = None,
+    ) -> None:
+        parsed = urlparse(url)
+        self._conn_options = NATSConnOptions(
+            hostname=parsed.hostname,
+            port=parsed.port,
+            username=parsed.username,
+            password=parsed.password,
+            scheme=parsed.scheme,
+            name=name,
+            tls_cacert=tls_cacert,
+            tls_client_cert=tls_client_cert,
+            tls_client_key=tls_client_key,
+            tls_hostname=tls_hostname,
+            tls_verify=tls_verify,
+            verbose=verbose,
+            pedantic=pedantic,
+        )
+        self._connect_command = _build_connect_command(self._conn_options)
+
+        self._reader: asyncio.StreamReader
+        self._writer: asyncio.StreamWriter
+        self._timeout = socket_timeout
+        self._broken = False
+        self._reading = False
+        self._read_progress: Optional["asyncio.Future[None]"] = None
+
+        self._ssid = 0
+        self._subs: Dict[int, NATSSubscription] = {}
+        self._nuid = NUID()
+        self._inbox_prefix = ""
+        self._inbox_seq = itertools.count()
+        self._tasks: Set["asyncio.Future[Any]"] = set()
+        self._task_error: Optional[BaseException] = None
+
+    async def __aenter__(self) -> "AsyncNATSClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, type_, value, traceback) -> None:
+        await self.close()
+
+    async def connect(self) -> None:
+        scheme = self._conn_options.scheme
+        if scheme not in ("nats", "tls"):
+            raise NATSInvalidSchemeError(f"got unsupported URI scheme: {scheme}")
+
+        self._reader, self._writer = await self._with_timeout(
+            asyncio.open_connection(
+                self._conn_options.hostname, self._conn_options.port
+            )
+        )
+        self._reset_inbox()
+        self._broken = False
+
+        if scheme == "nats":
+            await self._try_connection(tls_required=False)
+        else:
+            await self._try_connection(tls_required=True)
+            await self._connect_tls()
+
+        self._writer.write(self._connect_command)
+        await self._writer.drain()
+        if self._conn_options.verbose:
+            await self._recv(OK_OP)
+
+    def _reset_inbox(self) -> None:
+        self._inbox_prefix = (INBOX_PREFIX + self._nuid.next_() + b".").decode()
+        self._inbox_seq = itertools.count()
+
+    async def _try_connection(self, *, tls_required: bool) -> None:
+        _, result = await self._recv(INFO_OP)
+        server_info = json.loads(result)
+        server_tls_required = server_info.get("tls_required", False)
+
+        if not tls_required and server_tls_required:
+            raise NATSTLSConnectionRequiredError()
+        elif tls_required and not server_tls_required:
+            raise NATSTCPConnectionRequiredError()
+
+    async def _connect_tls(self) -> None:
+        ctx = _create_ssl_context(self._conn_options)
+
+        hostname = self._conn_options.hostname
+        if self._conn_options.tls_hostname is not None:
+            hostname = self._conn_options.tls_hostname
+
+        if hasattr(self._writer, "start_tls"):
+            await self._with_timeout(
+                self._writer.start_tls(ctx, server_hostname=hostname)
+            )
+            return
+
+        loop = asyncio.get_event_loop()
+        transport = self._writer.transport
+        protocol = transport.get_protocol()
+        tls_transport = await self._with_timeout(
+            loop.start_tls(transport, protocol, ctx, server_hostname=hostname)
+        )
+        self._writer = asyncio.StreamWriter(
+            tls_transport, protocol, self._reader, loop  # type: ignore
+        )
+
+    async def close(self) -> None:
+        try:
+            await self._join_tasks()
+        finally:
+            self._writer.close()
+            await self._writer.wait_closed()
+
+    async def _join_tasks(self) -> None:
+        # callbacks may schedule further callbacks, e.g. by waiting for replies
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        error, self._task_error = self._task_error, None
+        if error is not None:
+            raise error
+
+    def _task_done(self, task: "asyncio.Future[Any]") -> None:
+        self._tasks.discard(task)
+
+        # keep the first failure until close, the task itself is forgotten now
+        if not task.cancelled() and self._task_error is None:
+            self._task_error = task.exception()
+
+    async def reconnect(self) -> None:
+        await self.close()
+        await self.connect()
+
+    async def ping(self) -> None:
+        self._writer.write(_PING_LINE)
+        await self._writer.drain()
+        with self._read_guard():
+            await self._recv(PONG_OP)
+
+    async def subscribe(
+        self,
+        subject: Union[bytes, str],
+        *,
+        callback: Callable,
+        queue: Union[bytes, str] = "",
+        max_messages: Optional[int] = None,
+    ) -> NATSSubscription:
+        sub = NATSSubscription(
+            sid=self._ssid,
+            subject=subject,
+            queue=queue,
+            callback=callback,
+            max_messages=max_messages,
+        )
+
+        self._ssid += 1
+        self._subs[sub.sid] = sub
+        self._writer.write(_build_sub_command(sub))
+        await self._writer.drain()
+
+        return sub
+
+    async def unsubscribe(self, sub: NATSSubscription) -> None:
+        self._writer.write(f"UNSUB {sub.sid}\r\n".encode())
+        await self._writer.drain()
+        self._subs.pop(sub.sid)
+
+    async def auto_unsubscribe(self, sub: NATSSubscription) -> None:
+        if sub.max_messages is None:
+            return
+
+        self._writer.write(f"UNSUB {sub.sid} {sub.max_messages}\r\n".encode())
+        await self._writer.drain()
+
+    async def publish(
+        self,
+        subject: Union[bytes, str],
+        *,
+        payload: bytes = b"",
+        reply: Union[bytes, str] = "",
+    ) -> None:
+        self._write_pub(subject, reply, payload)
+        await self._writer.drain()
+
+    async def publish_many(
+        self, messages: Iterable[Tuple[Union[bytes, str], bytes]]
+    ) -> None:
+        for subject, payload in messages:
+            self._write_pub(subject, "", payload)
+        await self._writer.drain()
+
+    async def request(
+        self, subject: Union[bytes, str], *, payload: bytes = b""
+    ) -> NATSMessage:
+        reply_subject = f"{self._inbox_prefix}{next(self._inbox_seq):x}"
+        reply = _ReplyCapture()
+
+        sub = await self.subscribe(reply_subject, callback=reply, max_messages=1)
+        await self.auto_unsubscribe(sub)
+        await self.publish(subject, payload=payload, reply=reply_subject)
+        while reply.message is None:
+            if self._reading:
+                # e.g. called from a callback, the coroutine which is reading
+                # dispatches the reply
+                await self._wait_read_progress()
+            else:
+                await self.wait(count=1)
+
+        return reply.message
+
+    async def wait(self, *, count: Optional[int] = None) -> None:
+        with self._read_guard():
+            total = 0
+            while True:
+                command, result = await self._recv(MSG_OP, PING_OP, OK_OP)
+                if command == MSG_OP:
+                    await self._handle_message(result)
+                    self._notify_read_progress()
+
+                    total += 1
+                    if count is not None and total >= count:
+                        break
+                elif command == PING_OP:
+                    self._writer.write(_PONG_LINE)
+                    await self._writer.drain()
+
+    @contextmanager
+    def _read_guard(self) -> Iterator[None]:
+        if self._reading:
+            raise RuntimeError(
+                "another coroutine is already reading from this connection"
+            )
+
+        self._reading = True
+        try:
+            yield
+        finally:
+            self._reading = False
+            self._notify_read_progress()
+
+    def _notify_read_progress(self) -> None:
+        progress, self._read_progress = self._read_progress, None
+        if progress is not None and not progress.done():
+            progress.set_result(None)
+
+    async def _wait_read_progress(self) -> None:
+        if self._read_progress is None:
+            self._read_progress = asyncio.get_event_loop().create_future()
+
+        # the future is shared between waiters, a timeout must not cancel it
+        await self._with_timeout(asyncio.shield(self._read_progress))
+
+    def _write_pub(
+        self, subject: Union[bytes, str], reply: Union[bytes, str], payload: bytes
+    ) -> None:
+        if isinstance(subject, str):
+            subject = subject.encode()
+        if isinstance(reply, str):
+            reply = reply.encode()
+
+        if reply:
+            header = b"PUB %s %s %d\r\n" % (subject, reply, len(payload))
+        else:
+            header = b"PUB %s %d\r\n" % (subject, len(payload))
+
+        self._writer.writelines((header, payload, _CRLF_))
+
+    async def _recv(self, *commands: bytes) -> Tuple[bytes, Any]:
+        if self._broken:
+            raise NATSReadSocketError()
+
+        try:
+            line = await self._with_timeout(self._reader.readuntil(_CRLF_))
+        except asyncio.IncompleteReadError as e:
+            raise NATSReadSocketError() from e
+
+        return _parse_command(line, commands)
+
+    async def _handle_message(self, result: Tuple[bytes, bytes, bytes, int]) -> None:
+        subject, sid, reply, size = result
+
+        try:
+            payload = await self._with_timeout(
+                self._reader.readexactly(size + _CRLF_LEN)
+            )
+        except asyncio.IncompleteReadError as e:
+            raise NATSReadSocketError() from e
+        except asyncio.TimeoutError:
+            # the frame header is already consumed, the stream is out of sync now
+            self._broken = True
+            raise
+
+        message = NATSMessage(
+            sid=int(sid),
+            subject=subject,
+            reply=reply,
+            payload=payload[:-_CRLF_LEN],
+        )
+
+        sub = self._subs[message.sid]
+        received_messages = sub.received_messages + 1
+        sub.received_messages = received_messages
+
+        if received_messages == sub.max_messages:
+            del self._subs[message.sid]
+
+        coro = sub.callback(message)
+        if asyncio.iscoroutine(coro):
+            task = asyncio.ensure_future(coro)
+            self._tasks.add(task)
+            task.add_done_callback(self._task_done)
+
+    def _with_timeout(self, aw: Awaitable) -> Awaitable:
+        if self._timeout is None:
+            return aw
+
+        return asyncio.wait_for(aw, self._timeout)
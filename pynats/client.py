@@ -1,14 +1,16 @@
-import io
+import itertools
 import json
+import queue
 import re
 import socket
 import ssl
+import sys
+import threading
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import BinaryIO, Callable, Dict, Match, Optional, Pattern, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from urllib.parse import urlparse
 
-import pkg_resources
-
 from pynats.exceptions import (
     NATSInvalidResponse,
     NATSInvalidSchemeError,
@@ -19,6 +21,16 @@ from pynats.exceptions import (
 )
 from pynats.nuid import NUID
 
+if sys.version_info >= (3, 8):
+    from importlib.metadata import version as _pkg_version
+else:
+    from importlib_metadata import version as _pkg_version
+
+if sys.version_info >= (3, 7):
+    from queue import SimpleQueue as _Queue
+else:
+    from queue import Queue as _Queue
+
 __all__ = ("NATSSubscription", "NATSMessage", "NATSClient")
 
 
@@ -33,6 +45,9 @@ MSG_OP = b"MSG"
 OK_OP = b"+OK"
 ERR_OP = b"-ERR"
 
+ERR_RE = re.compile(rb"^-ERR\s+('.+')?\r\n")
+
+# not used by the parser anymore, kept for backward compatibility
 INFO_RE = re.compile(rb"^INFO\s+([^\r\n]+)\r\n")
 PING_RE = re.compile(rb"^PING\r\n")
 PONG_RE = re.compile(rb"^PONG\r\n")
@@ -40,28 +55,113 @@ MSG_RE = re.compile(
     rb"^MSG\s+(?P<subject>[^\s\r\n]+)\s+(?P<sid>[^\s\r\n]+)\s+(?P<reply>([^\s\r\n]+)[^\S\r\n]+)?(?P<size>\d+)\r\n"  # noqa
 )
 OK_RE = re.compile(rb"^\+OK\s*\r\n")
-ERR_RE = re.compile(rb"^-ERR\s+('.+')?\r\n")
 
 _CRLF_ = b"\r\n"
+_CRLF_LEN = len(_CRLF_)
 _SPC_ = b" "
 
-COMMANDS = {
-    INFO_OP: INFO_RE,
-    PING_OP: PING_RE,
-    PONG_OP: PONG_RE,
-    MSG_OP: MSG_RE,
-    OK_OP: OK_RE,
-    ERR_OP: ERR_RE,
-}
+_PING_LINE = PING_OP + _CRLF_
+_PONG_LINE = PONG_OP + _CRLF_
+_OK_LINE = OK_OP + _CRLF_
+
+_VERSION = _pkg_version("nats-python")
+
+INBOX_PREFIX = b"_INBOX."
+
+FLUSH_THRESHOLD = 64 * 1024
+
+SENDMSG_THRESHOLD = 16 * 1024
+
+_READER_COMMANDS = (INFO_OP, MSG_OP, PING_OP, PONG_OP, OK_OP, ERR_OP)
+
+
+def _parse_info(line: bytes) -> bytes:
+    command, _, info = line[:-_CRLF_LEN].partition(_SPC_)
+    if command != INFO_OP or not info:
+        raise NATSInvalidResponse(line)
+
+    return info
+
+
+def _parse_msg(line: bytes) -> Tuple[bytes, bytes, bytes, int]:
+    parts = line.split()
+
+    try:
+        if len(parts) == 4:
+            command, subject, sid, size = parts
+            reply = b""
+        else:
+            command, subject, sid, reply, size = parts
+
+        # int() alone would also accept signs and underscores
+        if command == MSG_OP and sid.isdigit() and size.isdigit():
+            return subject, sid, reply, int(size)
+    except ValueError:
+        pass
+
+    raise NATSInvalidResponse(line)
+
+
+def _parse_ping(line: bytes) -> bytes:
+    if line != _PING_LINE:
+        raise NATSInvalidResponse(line)
+
+    return line
+
+
+def _parse_pong(line: bytes) -> bytes:
+    if line != _PONG_LINE:
+        raise NATSInvalidResponse(line)
+
+    return line
+
+
+def _parse_ok(line: bytes) -> bytes:
+    if line != _OK_LINE:
+        raise NATSInvalidResponse(line)
+
+    return line
+
+
+def _parse_err(line: bytes) -> bytes:
+    if ERR_RE.match(line) is None:
+        raise NATSInvalidResponse(line)
+
+    _, _, message = line[:-_CRLF_LEN].partition(_SPC_)
+    return message
 
-INBOX_PREFIX = bytearray(b"_INBOX.")
+
+def _parse_command(line: bytes, commands: Tuple[bytes, ...]) -> Tuple[bytes, Any]:
+    parse: Callable[[bytes], Any]
+
+    first = line[0]
+    if first == 77:  # M
+        command, parse = MSG_OP, _parse_msg
+    elif first == 80:  # P
+        if line[1] == 73:  # I
+            command, parse = PING_OP, _parse_ping
+        else:
+            command, parse = PONG_OP, _parse_pong
+    elif first == 43:  # +
+        command, parse = OK_OP, _parse_ok
+    elif first == 45:  # -
+        command, parse = ERR_OP, _parse_err
+    elif first == 73:  # I
+        command, parse = INFO_OP, _parse_info
+    else:
+        raise NATSUnexpectedResponse(line)
+
+    if command not in commands:
+        raise NATSUnexpectedResponse(line)
+
+    return command, parse(line)
 
 
 @dataclass
 class NATSSubscription:
     sid: int
-    subject: str
-    queue: str
+    subject: Union[bytes, str]
+    queue: Union[bytes, str]
     callback: Callable
     max_messages: Optional[int] = None
     received_messages: int = 0
@@ -75,11 +175,21 @@ class NATSSubscription:
 
 @dataclass
 class NATSMessage:
+    __slots__ = ("sid", "subject", "reply", "payload")
+
     sid: int
-    subject: str
-    reply: str
+    subject: bytes
+    reply: bytes
     payload: bytes
 
+    @property
+    def subject_str(self) -> str:
+        return self.subject.decode()
+
+    @property
+    def reply_str(self) -> str:
+        return self.reply.decode()
+
 
 @dataclass
 class NATSConnOptions:
@@ -96,20 +206,201 @@ class NATSConnOptions:
     tls_client_key: Optional[str] = None
     tls_hostname: Optional[str] = None
     tls_verify: bool = False
-    version: str = pkg_resources.get_distribution("nats-python").version
+    version: str = _VERSION
     verbose: bool = False
     pedantic: bool = False
 
 
+def _build_connect_command(conn_options: NATSConnOptions) -> bytes:
+    options = {
+        "name": conn_options.name,
+        "lang": conn_options.lang,
+        "protocol": conn_options.protocol,
+        "version": conn_options.version,
+        "verbose": conn_options.verbose,
+        "pedantic": conn_options.pedantic,
+    }
+
+    if conn_options.username and conn_options.password:
+        options["user"] = conn_options.username
+        options["pass"] = conn_options.password
+    elif conn_options.username:
+        options["auth_token"] = conn_options.username
+
+    return _SPC_.join((CONNECT_OP, json.dumps(options).encode())) + _CRLF_
+
+
+def _build_sub_command(sub: NATSSubscription) -> bytes:
+    subject = sub.subject
+    if isinstance(subject, str):
+        subject = subject.encode()
+
+    if not sub.queue:
+        return b"SUB %s %d\r\n" % (subject, sub.sid)
+
+    queue = sub.queue
+    if isinstance(queue, str):
+        queue = queue.encode()
+
+    return b"SUB %s %s %d\r\n" % (subject, queue, sub.sid)
+
+
+def _create_ssl_context(conn_options: NATSConnOptions) -> ssl.SSLContext:
+    ctx = ssl.create_default_context(purpose=ssl.Purpose.SERVER_AUTH)
+    if not conn_options.tls_verify:
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+
+    if conn_options.tls_cacert is not None:
+        ctx.load_verify_locations(cafile=conn_options.tls_cacert)
+
+    if (
+        conn_options.tls_client_cert is not None
+        and conn_options.tls_client_key is not None
+    ):
+        ctx.load_cert_chain(
+            certfile=conn_options.tls_client_cert,
+            keyfile=conn_options.tls_client_key,
+        )
+
+    return ctx
+
+
+class _ReplyCapture:
+    __slots__ = ("message",)
+
+    def __init__(self) -> None:
+        self.message: Optional[NATSMessage] = None
+
+    def __call__(self, message: NATSMessage) -> None:
+        self.message = message
+
+
+class _RecvBuffer:
+    __slots__ = (
+        "_sock",
+        "_buf",
+        "_view",
+        "_head",
+        "_tail",
+        "_broken",
+        "retry_timeouts",
+    )
+
+    def __init__(self, sock: socket.socket, size: int) -> None:
+        self._sock = sock
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._head = 0
+        self._tail = 0
+        self._broken = False
+        self.retry_timeouts = False
+
+    def readline(self) -> bytes:
+        if self._broken:
+            raise NATSReadSocketError()
+
+        scanned = 0
+        while True:
+            end = self._buf.find(_CRLF_, self._head + scanned, self._tail)
+            if end != -1:
+                end += _CRLF_LEN
+                line = bytes(self._view[self._head : end])
+                self._head = end
+                return line
+
+            # resume the search after refill, keep a possibly split CRLF in range
+            scanned = max(self._tail - self._head - _CRLF_LEN + 1, 0)
+            self._fill()
+
+    def read(self, size: int, skip: int = 0) -> bytes:
+        # returns `size` bytes and drops the following `skip` bytes
+        try:
+            return self._read(size, size + skip)
+        except socket.timeout:
+            # the frame header is already consumed, the stream is out of sync now
+            self._broken = True
+            raise
+
+    def _read(self, size: int, total: int) -> bytes:
+        if total > len(self._buf):
+            return self._read_large(size, total)
+
+        while self._tail - self._head < total:
+            self._fill()
+
+        start = self._head
+        self._head = start + total
+        return bytes(self._view[start : start + size])
+
+    def _read_large(self, size: int, total: int) -> bytes:
+        data = bytearray(total)
+        view = memoryview(data)
+
+        filled = self._tail - self._head
+        view[:filled] = self._view[self._head : self._tail]
+        self._head = self._tail = 0
+
+        while filled < total:
+            read = self._recv_into(view[filled:])
+            if not read:
+                raise NATSReadSocketError()
+            filled += read
+
+        return bytes(view[:size])
+
+    def _fill(self) -> None:
+        if self._head == self._tail:
+            self._head = self._tail = 0
+        elif self._tail == len(self._buf):
+            residual = self._tail - self._head
+            if residual == len(self._buf):
+                buf = bytearray(2 * len(self._buf))
+                buf[:residual] = self._buf
+                self._buf = buf
+                self._view = memoryview(buf)
+            else:
+                self._view[:residual] = self._view[self._head : self._tail]
+            self._head, self._tail = 0, residual
+
+        read = self._recv_into(self._view[self._tail :])
+        if not read:
+            raise NATSReadSocketError()
+        self._tail += read
+
+    def _recv_into(self, view: memoryview) -> int:
+        while True:
+            try:
+                return self._sock.recv_into(view)
+            except socket.timeout:
+                if not self.retry_timeouts:
+                    raise
+            except OSError as e:
+                # the socket was closed by another thread while waiting for data
+                if self._sock.fileno() == -1:
+                    raise NATSReadSocketError() from e
+                raise
+
+
 class NATSClient:
     __slots__ = (
         "_conn_options",
         "_socket",
-        "_socket_file",
+        "_recv_buffer",
         "_socket_options",
         "_ssid",
         "_subs",
         "_nuid",
+        "_inbox_prefix",
+        "_inbox_seq",
+        "_wbuf",
+        "_wbuf_flushes",
+        "_auto_flush",
+        "_use_sendmsg",
+        "_connect_command",
+        "_reader_thread",
+        "_reader",
+        "_read_queue",
     )
 
     def __init__(
@@ -126,6 +417,10 @@ class NATSClient:
         tls_verify: bool = False,
         socket_timeout: float = None,
         socket_keepalive: bool = False,
+        socket_rcvbuf: Optional[int] = None,
+        socket_sndbuf: Optional[int] = None,
+        recv_buffer_size: int = 256 * 1024,
+        reader_thread: bool = False,
     ) -> None:
         parsed = urlparse(url)
         self._conn_options = NATSConnOptions(
@@ -145,15 +440,30 @@ class NATSClient:
         )
 
         self._socket: socket.socket
-        self._socket_file: BinaryIO
-        self._socket_options = {
+        self._recv_buffer: _RecvBuffer
+        self._socket_options: Dict[str, Any] = {
             "timeout": socket_timeout,
             "keepalive": socket_keepalive,
+            "rcvbuf": socket_rcvbuf,
+            "sndbuf": socket_sndbuf,
+            "recv_buffer_size": recv_buffer_size,
         }
 
         self._ssid = 0
         self._subs: Dict[int, NATSSubscription] = {}
         self._nuid = NUID()
+        self._inbox_prefix = ""
+        self._inbox_seq = itertools.count()
+
+        self._wbuf = bytearray()
+        self._wbuf_flushes = 0
+        self._auto_flush = True
+        self._use_sendmsg = False
+        self._connect_command = _build_connect_command(self._conn_options)
+
+        self._reader_thread = reader_thread
+        self._reader: Optional[threading.Thread] = None
+        self._read_queue: Optional[_Queue] = None
 
     def __enter__(self) -> "NATSClient":
         self.connect()
@@ -163,17 +473,19 @@ class NATSClient:
         self.close()
 
     def connect(self) -> None:
-        sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_STREAM)
+        if self._reader_thread and self._conn_options.scheme == "tls":
+            # SSLSocket can't be read and written from two threads at once
+            raise NATSInvalidSchemeError("reader_thread is not supported with TLS")
 
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-        if self._socket_options["keepalive"]:
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self._reader = self._read_queue = None
 
-        sock.settimeout(self._socket_options["timeout"])
+        sock = self._create_socket()
         sock.connect((self._conn_options.hostname, self._conn_options.port))
 
-        self._socket_file = sock.makefile("rb")
+        self._recv_buffer = _RecvBuffer(sock, self._socket_options["recv_buffer_size"])
         self._socket = sock
+        self._wbuf.clear()
+        self._reset_inbox()
 
         scheme = self._conn_options.scheme
 
@@ -187,11 +499,42 @@ class NATSClient:
 
         self._send_connect_command()
         if self._conn_options.verbose:
-            self._recv(OK_RE)
+            self._recv(OK_OP)
+
+        # SSL sockets do not implement sendmsg
+        self._use_sendmsg = hasattr(self._socket, "sendmsg") and not isinstance(
+            self._socket, ssl.SSLSocket
+        )
+
+        if self._reader_thread:
+            self._start_reader()
+
+    def _create_socket(self) -> socket.socket:
+        sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_STREAM)
+
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self._socket_options["keepalive"]:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if self._socket_options["rcvbuf"] is not None:
+            sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, self._socket_options["rcvbuf"]
+            )
+        if self._socket_options["sndbuf"] is not None:
+            sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_SNDBUF, self._socket_options["sndbuf"]
+            )
+
+        sock.settimeout(self._socket_options["timeout"])
+
+        return sock
+
+    def _reset_inbox(self) -> None:
+        self._inbox_prefix = (INBOX_PREFIX + self._nuid.next_() + b".").decode()
+        self._inbox_seq = itertools.count()
 
     def _try_connection(self, *, tls_required: bool) -> None:
-        _, result = self._recv(INFO_RE)
-        server_info = json.loads(result.group(1))
+        _, result = self._recv(INFO_OP)
+        server_info = json.loads(result)
         server_tls_required = server_info.get("tls_required", False)
 
         if not tls_required and server_tls_required:
@@ -200,49 +543,79 @@ class NATSClient:
             raise NATSTCPConnectionRequiredError()
 
     def _connect_tls(self) -> None:
-        ctx = ssl.create_default_context(purpose=ssl.Purpose.SERVER_AUTH)
-        if not self._conn_options.tls_verify:
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE
-
-        if self._conn_options.tls_cacert is not None:
-            ctx.load_verify_locations(cafile=self._conn_options.tls_cacert)
-
-        if (
-            self._conn_options.tls_client_cert is not None
-            and self._conn_options.tls_client_key is not None
-        ):
-            ctx.load_cert_chain(
-                certfile=self._conn_options.tls_client_cert,
-                keyfile=self._conn_options.tls_client_key,
-            )
+        ctx = _create_ssl_context(self._conn_options)
 
         hostname = self._conn_options.hostname
         if self._conn_options.tls_hostname is not None:
             hostname = self._conn_options.tls_hostname
 
         self._socket = ctx.wrap_socket(self._socket, server_hostname=hostname)
-        self._socket_file = self._socket.makefile("rb")
+        self._recv_buffer = _RecvBuffer(
+            self._socket, self._socket_options["recv_buffer_size"]
+        )
+
+    def _start_reader(self) -> None:
+        # timeouts are applied when taking commands off the queue
+        self._recv_buffer.retry_timeouts = True
+        self._read_queue = _Queue()
+        self._reader = threading.Thread(
+            target=self._read_loop, args=(self._read_queue,), daemon=True
+        )
+        self._reader.start()
 
     def close(self) -> None:
-        self._socket.shutdown(socket.SHUT_RDWR)
-        self._socket_file.close()
-        self._socket.close()
+        try:
+            self.flush()
+        finally:
+            self._socket.shutdown(socket.SHUT_RDWR)
+            self._socket.close()
+
+        if self._reader is not None:
+            self._reader.join()
 
     def reconnect(self) -> None:
         self.close()
         self.connect()
 
     def ping(self) -> None:
-        self._send(PING_OP)
-        self._recv(PONG_RE)
+        self._write(_PING_LINE)
+        self.flush()
+        self._recv(PONG_OP)
+
+    def flush(self) -> None:
+        if self._wbuf:
+            self._socket.sendall(self._wbuf)
+            self._wbuf.clear()
+            self._wbuf_flushes += 1
+
+    @contextmanager
+    def pipeline(self) -> Iterator["NATSClient"]:
+        auto_flush = self._auto_flush
+        start = len(self._wbuf)
+        flushes = self._wbuf_flushes
+        self._auto_flush = False
+        try:
+            yield self
+        except BaseException:
+            # drop commands of the failed block which are still buffered, they must
+            # not be sent along with the next unrelated command; a flush always
+            # leaves the buffer empty, so after one everything buffered is ours
+            if self._wbuf_flushes == flushes:
+                del self._wbuf[start:]
+            else:
+                self._wbuf.clear()
+            raise
+        finally:
+            self._auto_flush = auto_flush
+
+        self.flush()
 
     def subscribe(
         self,
-        subject: str,
+        subject: Union[bytes, str],
         *,
         callback: Callable,
-        queue: str = "",
+        queue: Union[bytes, str] = "",
         max_messages: Optional[int] = None,
     ) -> NATSSubscription:
         sub = NATSSubscription(
@@ -255,142 +628,188 @@ class NATSClient:
 
         self._ssid += 1
         self._subs[sub.sid] = sub
-        self._send(SUB_OP, sub.subject, sub.queue, sub.sid)
+        self._write(_build_sub_command(sub))
 
         return sub
 
     def unsubscribe(self, sub: NATSSubscription) -> None:
-        self._send(UNSUB_OP, sub.sid)
+        self._write(f"UNSUB {sub.sid}\r\n".encode())
         self._subs.pop(sub.sid)
 
     def auto_unsubscribe(self, sub: NATSSubscription) -> None:
         if sub.max_messages is None:
             return
 
-        self._send(UNSUB_OP, sub.sid, sub.max_messages)
+        self._write(f"UNSUB {sub.sid} {sub.max_messages}\r\n".encode())
 
-    def publish(self, subject: str, *, payload: bytes = b"", reply: str = "") -> None:
-        self._send(PUB_OP, subject, reply, len(payload))
-        self._send(payload)
-
-    def request(self, subject: str, *, payload: bytes = b"") -> NATSMessage:
-        next_inbox = INBOX_PREFIX[:]
-        next_inbox.extend(self._nuid.next_())
+    def publish(
+        self,
+        subject: Union[bytes, str],
+        *,
+        payload: bytes = b"",
+        reply: Union[bytes, str] = "",
+    ) -> None:
+        self._send_pub(subject, reply, payload)
 
-        reply_subject = next_inbox.decode()
-        reply_messages: Dict[int, NATSMessage] = {}
+    def publish_many(self, messages: Iterable[Tuple[Union[bytes, str], bytes]]) -> None:
+        with self.pipeline():
+            for subject, payload in messages:
+                self._send_pub(subject, "", payload)
 
-        def callback(message: NATSMessage) -> None:
-            reply_messages[message.sid] = message
+    def request(
+        self, subject: Union[bytes, str], *, payload: bytes = b""
+    ) -> NATSMessage:
+        reply_subject = f"{self._inbox_prefix}{next(self._inbox_seq):x}"
+        reply = _ReplyCapture()
 
-        sub = self.subscribe(reply_subject, callback=callback, max_messages=1)
+        sub = self.subscribe(reply_subject, callback=reply, max_messages=1)
         self.auto_unsubscribe(sub)
-        self.publish(subject, payload=payload, reply=reply_subject)
-        self.wait(count=1)
+        self._send_pub(subject, reply_subject, payload)
+        while reply.message is None:
+            self._wait(1)
 
-        return reply_messages[sub.sid]
+        return reply.message
 
     def wait(self, *, count=None) -> None:
+        self._wait(count)
+
+    def _wait(self, count: Optional[int]) -> None:
+        self.flush()
+
         total = 0
         while True:
-            command, result = self._recv(MSG_RE, PING_RE, OK_RE)
-            if command is MSG_RE:
+            command, result = self._recv(MSG_OP, PING_OP, OK_OP)
+            if command == MSG_OP:
                 self._handle_message(result)
 
                 total += 1
                 if count is not None and total >= count:
                     break
-            elif command is PING_RE:
-                self._send(PONG_OP)
+            elif command == PING_OP:
+                self._write(_PONG_LINE)
+                self.flush()
 
     def _send_connect_command(self) -> None:
-        options = {
-            "name": self._conn_options.name,
-            "lang": self._conn_options.lang,
-            "protocol": self._conn_options.protocol,
-            "version": self._conn_options.version,
-            "verbose": self._conn_options.verbose,
-            "pedantic": self._conn_options.pedantic,
-        }
-
-        if self._conn_options.username and self._conn_options.password:
-            options["user"] = self._conn_options.username
-            options["pass"] = self._conn_options.password
-        elif self._conn_options.username:
-            options["auth_token"] = self._conn_options.username
-
-        self._send(CONNECT_OP, json.dumps(options))
-
-    def _send(self, *parts: Union[bytes, str, int]) -> None:
-        self._socket.sendall(_SPC_.join(self._encode(p) for p in parts) + _CRLF_)
+        self._write(self._connect_command)
 
-    def _encode(self, value: Union[bytes, str, int]) -> bytes:
-        if isinstance(value, bytes):
-            return value
-        elif isinstance(value, str):
-            return value.encode()
-        elif isinstance(value, int):  # pragma: no branch
-            return f"{value:d}".encode()
-
-        raise RuntimeError(f"got unsupported type for encoding: type={type(value)}")
-
-    def _recv(self, *commands: Pattern[bytes]) -> Tuple[Pattern[bytes], Match[bytes]]:
-        line = self._readline()
-
-        command = self._get_command(line)
-        if command not in commands:
-            raise NATSUnexpectedResponse(line)
+    def _write(self, data: bytes) -> None:
+        if self._auto_flush and not self._wbuf:
+            self._socket.sendall(data)
+            return
 
-        result = command.match(line)
-        if result is None:
-            raise NATSInvalidResponse(line)
+        self._wbuf += data
 
-        return command, result
+        if self._auto_flush or len(self._wbuf) >= FLUSH_THRESHOLD:
+            self.flush()
 
-    def _readline(self, *, size: int = None) -> bytes:
-        read = io.BytesIO()
+    def _send_pub(
+        self, subject: Union[bytes, str], reply: Union[bytes, str], payload: bytes
+    ) -> None:
+        if isinstance(subject, str):
+            subject = subject.encode()
 
-        while True:
-            line = self._socket_file.readline()
-            if not line:
-                raise NATSReadSocketError()
+        if reply:
+            if isinstance(reply, str):
+                reply = reply.encode()
+            header = b"PUB %s %s %d\r\n" % (subject, reply, len(payload))
+        else:
+            header = b"PUB %s %d\r\n" % (subject, len(payload))
 
-            read.write(line)
+        if self._auto_flush and not self._wbuf:
+            if self._use_sendmsg and len(payload) >= SENDMSG_THRESHOLD:
+                self._sendmsg([header, payload, _CRLF_])
+            else:
+                self._socket.sendall(b"".join((header, payload, _CRLF_)))
+            return
 
-            if size is not None:
-                if read.tell() == size + len(_CRLF_):
+        self._wbuf += header
+        self._wbuf += payload
+        self._wbuf += _CRLF_
+
+        if self._auto_flush or len(self._wbuf) >= FLUSH_THRESHOLD:
+            self.flush()
+
+    def _sendmsg(self, buffers: List[bytes]) -> None:
+        # hand the buffers to the kernel as is, without joining large payloads
+        views = [memoryview(buffer) for buffer in buffers]
+        while views:
+            sent = self._socket.sendmsg(views)
+            while sent:
+                size = len(views[0])
+                if sent < size:
+                    views[0] = views[0][sent:]
                     break
-            elif line.endswith(_CRLF_):  # pragma: no branch
-                break
+                sent -= size
+                del views[0]
 
-        return read.getvalue()
+    def _recv(self, *commands: bytes) -> Tuple[bytes, Any]:
+        if self._read_queue is not None:
+            return self._recv_queued(commands)
 
-    def _strip(self, line: bytes) -> bytes:
-        return line[: -len(_CRLF_)]
+        command, result = _parse_command(self._readline_command(), commands)
+        if command == MSG_OP:
+            result = self._read_message(result)
 
-    def _get_command(self, line: bytes) -> Optional[Pattern[bytes]]:
-        values = self._strip(line).split(b" ", 1)
+        return command, result
 
-        return COMMANDS.get(values[0])
+    def _recv_queued(self, commands: Tuple[bytes, ...]) -> Tuple[bytes, Any]:
+        read_queue: _Queue = self._read_queue  # type: ignore
+        try:
+            item = read_queue.get(timeout=self._socket_options["timeout"])
+        except queue.Empty:
+            raise socket.timeout("timed out") from None
 
-    def _handle_message(self, result: Match[bytes]) -> None:
-        message_data = result.groupdict()
+        if isinstance(item, Exception):
+            if not isinstance(item, (NATSUnexpectedResponse, NATSInvalidResponse)):
+                # the reader is gone, keep failing subsequent reads the same way
+                read_queue.put(item)
+            raise item
 
-        message_payload_size = int(message_data["size"])
-        message_payload = self._readline(size=message_payload_size)
-        message_payload = self._strip(message_payload)
+        line, command, result = item
+        if command not in commands:
+            raise NATSUnexpectedResponse(line)
 
-        message = NATSMessage(
-            sid=int(message_data["sid"].decode()),
-            subject=message_data["subject"].decode(),
-            reply=message_data["reply"].decode() if message_data["reply"] else "",
-            payload=message_payload,
+        return command, result
+
+    def _read_loop(self, read_queue: _Queue) -> None:
+        while True:
+            try:
+                line = self._readline_command()
+                command, result = _parse_command(line, _READER_COMMANDS)
+                if command == MSG_OP:
+                    result = self._read_message(result)
+            except (NATSUnexpectedResponse, NATSInvalidResponse) as e:
+                # raised to the caller once, like without the reader thread
+                read_queue.put(e)
+                continue
+            except Exception as e:
+                read_queue.put(e)
+                return
+
+            read_queue.put((line, command, result))
+
+    def _readline_command(self) -> bytes:
+        return self._recv_buffer.readline()
+
+    def _read_payload(self, size: int) -> bytes:
+        return self._recv_buffer.read(size, _CRLF_LEN)
+
+    def _read_message(self, result: Tuple[bytes, bytes, bytes, int]) -> NATSMessage:
+        subject, sid, reply, size = result
+
+        return NATSMessage(
+            sid=int(sid),
+            subject=subject,
+            reply=reply,
+            payload=self._read_payload(size),
         )
 
+    def _handle_message(self, message: NATSMessage) -> None:
         sub = self._subs[message.sid]
-        sub.received_messages += 1
+        received_messages = sub.received_messages + 1
+        sub.received_messages = received_messages
 
-        if sub.is_wasted():
-            self._subs.pop(sub.sid)
+        if received_messages == sub.max_messages:
+            del self._subs[message.sid]
 
         sub.callback(message)
@@ -0,0 +1,49 @@
+import socket
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def fake_server():
+    threads = []
+
+    def serve(*frames: bytes) -> str:
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        listener.settimeout(5)
+
+        def run():
+            with listener:
+                conn, _ = listener.accept()
+
+            with conn:
+                conn.settimeout(5)
+                conn.sendall(b'INFO {"server_id":"fake"}\r\n')
+
+                received = b""
+                while b"CONNECT" not in received:
+                    received += conn.recv(4096)
+
+                for frame in frames:
+                    conn.sendall(frame)
+
+                # keep the connection open until the client goes away
+                try:
+                    while conn.recv(4096):
+                        pass
+                except OSError:
+                    pass
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        threads.append(thread)
+
+        host, port = listener.getsockname()
+        return f"nats://{host}:{port}"
+
+    yield serve
+
+    for thread in threads:
+        thread.join(5)
@@ -0,0 +1,248 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+from pynats import AsyncNATSClient
+from pynats.exceptions import NATSInvalidSchemeError, NATSReadSocketError
+
+pytestmark = pytest.mark.skipif(
+    sys.version_info < (3, 7), reason="asyncio client requires Python 3.7+"
+)
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+@pytest.fixture
+def nats_plain_url():
+    return os.environ.get("NATS_PLAIN_URL", "nats://127.0.0.1:4222")
+
+
+@pytest.fixture
+def nats_tls_url():
+    return os.environ.get("NATS_TLS_URL", "tls://127.0.0.1:4224")
+
+
+def test_connect_and_close(nats_plain_url):
+    async def main():
+        client = AsyncNATSClient(nats_plain_url, socket_timeout=2)
+
+        await client.connect()
+        await client.ping()
+        await client.close()
+
+    run(main())
+
+
+def test_tls_connect(nats_tls_url):
+    async def main():
+        async with AsyncNATSClient(nats_tls_url, socket_timeout=2) as client:
+            await client.ping()
+
+    run(main())
+
+
+def test_invalid_scheme():
+    client = AsyncNATSClient("http://127.0.0.1:4224")
+
+    with pytest.raises(NATSInvalidSchemeError):
+        run(client.connect())
+
+
+def test_subscribe_timeout(nats_plain_url):
+    async def main():
+        async with AsyncNATSClient(nats_plain_url, socket_timeout=2) as client:
+            sub = await client.subscribe(
+                "test-subject", callback=lambda x: x, max_messages=1
+            )
+
+            with pytest.raises(asyncio.TimeoutError):
+                await client.wait(count=1)
+
+            await client.unsubscribe(sub)
+
+    run(main())
+
+
+def test_wait_timeout_inside_message(fake_server):
+    received = []
+
+    payload = b"PING\r\nMSG evil 0 4\r\nfake\r\n"
+    url = fake_server(b"MSG test-subject 0 %d\r\n" % (len(payload) + 8) + payload)
+
+    async def main():
+        async with AsyncNATSClient(url, socket_timeout=0.5) as client:
+            await client.subscribe("test-subject", callback=received.append)
+
+            with pytest.raises(asyncio.TimeoutError):
+                await client.wait(count=1)
+
+            with pytest.raises(NATSReadSocketError):
+                await client.wait(count=1)
+
+    run(main())
+
+    assert received == []
+
+
+def test_publish(nats_plain_url):
+    received = []
+
+    async def callback(message):
+        received.append(message)
+
+    async def main():
+        async with AsyncNATSClient(nats_plain_url, socket_timeout=2) as client:
+            await client.subscribe("test-subject", callback=callback, max_messages=2)
+            await client.publish("test-subject")
+            await client.publish("test-subject", payload=b"test-payload")
+            await client.wait(count=2)
+
+    run(main())
+
+    assert len(received) == 2
+
+    assert received[0].subject == b"test-subject"
+    assert received[0].reply == b""
+    assert received[0].payload == b""
+
+    assert received[1].subject == b"test-subject"
+    assert received[1].reply == b""
+    assert received[1].payload == b"test-payload"
+
+
+@pytest.mark.parametrize("finished", [False, True])
+def test_callback_error_raised_on_close(nats_plain_url, finished):
+    async def callback(message):
+        raise RuntimeError("test-error")
+
+    async def main():
+        async with AsyncNATSClient(nats_plain_url, socket_timeout=2) as client:
+            await client.subscribe("test-subject", callback=callback, max_messages=1)
+            await client.publish("test-subject")
+            await client.wait(count=1)
+
+            if finished:
+                # gives the callback a chance to fail before close is called
+                await client.ping()
+
+    with pytest.raises(RuntimeError, match="test-error"):
+        run(main())
+
+
+def test_request_from_callback(nats_plain_url):
+    async def worker(ready):
+        async with AsyncNATSClient(nats_plain_url, socket_timeout=2) as client:
+
+            async def echo(message):
+                await client.publish(message.reply, payload=message.payload)
+
+            async def callback(message):
+                resp = await client.request("test-echo", payload=b"test-echo-payload")
+                await client.publish(message.reply, payload=resp.payload)
+
+            await client.subscribe("test-echo", callback=echo, max_messages=1)
+            await client.subscribe("test-subject", callback=callback, max_messages=1)
+            await client.ping()
+            ready.set()
+            # the request, the echoed request and the reply to it
+            await client.wait(count=3)
+
+    async def main():
+        ready = asyncio.Event()
+        task = asyncio.ensure_future(worker(ready))
+        await asyncio.wait_for(ready.wait(), 5)
+
+        async with AsyncNATSClient(nats_plain_url, socket_timeout=2) as client:
+            resp = await client.request("test-subject")
+            assert resp.payload == b"test-echo-payload"
+
+        await task
+
+    run(main())
+
+
+def test_wait_from_callback(nats_plain_url):
+    errors = []
+
+    async def main():
+        async with AsyncNATSClient(nats_plain_url, socket_timeout=2) as client:
+
+            async def callback(message):
+                if message.payload:
+                    return
+
+                try:
+                    await client.wait(count=1)
+                except RuntimeError as e:
+                    errors.append(e)
+
+                await client.publish("test-subject", payload=b"test-payload")
+
+            await client.subscribe("test-subject", callback=callback, max_messages=2)
+            await client.publish("test-subject")
+            await client.wait(count=2)
+
+    run(main())
+
+    assert len(errors) == 1
+
+    assert "already reading" in str(errors[0])
+
+
+def test_publish_many(nats_plain_url):
+    received = []
+
+    async def main():
+        async with AsyncNATSClient(nats_plain_url, socket_timeout=2) as client:
+            await client.subscribe(
+                "test-subject", callback=received.append, max_messages=2
+            )
+            await client.publish_many(
+                [("test-subject", b""), ("test-subject", b"test-payload")]
+            )
+            await client.wait(count=2)
+
+    run(main())
+
+    assert len(received) == 2
+
+    assert received[0].payload == b""
+    assert received[1].payload == b"test-payload"
+
+
+def test_request(nats_plain_url):
+    async def worker(ready):
+        async with AsyncNATSClient(nats_plain_url, socket_timeout=2) as client:
+
+            async def callback(message):
+                await client.publish(message.reply, payload=b"test-callback-payload")
+
+            await client.subscribe(
+                "test-subject", callback=callback, queue="test-queue", max_messages=1
+            )
+            await client.ping()
+            ready.set()
+            await client.wait(count=1)
+
+    async def main():
+        ready = asyncio.Event()
+        task = asyncio.ensure_future(worker(ready))
+        await asyncio.wait_for(ready.wait(), 5)
+
+        async with AsyncNATSClient(nats_plain_url, socket_timeout=2) as client:
+            resp = await client.request("test-subject", payload=b"test-payload")
+            assert resp.subject.startswith(b"_INBOX.")
+            assert resp.reply == b""
+            assert resp.payload == b"test-callback-payload"
+
+        await task
+
+    run(main())
@@ -1,16 +1,25 @@
 import os
 import socket
 import threading
-import time
+from concurrent.futures import ThreadPoolExecutor
 
 import msgpack
 import pytest
 
 from pynats import NATSClient
-from pynats.exceptions import NATSInvalidSchemeError, NATSReadSocketError
+from pynats.exceptions import (
+    NATSInvalidResponse,
+    NATSInvalidSchemeError,
+    NATSReadSocketError,
+    NATSUnexpectedResponse,
+)
 
+packer = msgpack.Packer()
 
-@pytest.fixture
+packed_replies = {True: packer.pack({b"v": 3338}), False: packer.pack({b"v": 32})}
+
+
+@pytest.fixture(scope="module")
 def nats_plain_url():
     return os.environ.get("NATS_PLAIN_URL", "nats://127.0.0.1:4222")
 
@@ -20,6 +29,27 @@ def nats_tls_url():
     return os.environ.get("NATS_TLS_URL", "tls://127.0.0.1:4224")
 
 
+@pytest.fixture(scope="module")
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+@pytest.fixture(scope="module")
+def shared_client(nats_plain_url):
+    with NATSClient(nats_plain_url, socket_timeout=2) as client:
+        yield client
+
+
+@pytest.fixture
+def client(shared_client):
+    yield shared_client
+
+    for sub in list(shared_client._subs.values()):
+        shared_client.unsubscribe(sub)
+    shared_client.ping()
+
+
 def test_connect_and_close(nats_plain_url):
     client = NATSClient(nats_plain_url, socket_timeout=2)
 
@@ -33,6 +63,104 @@ def test_connect_and_close_using_context_manager(nats_plain_url):
         client.ping()
 
 
+def test_connect_with_buffer_sizes(nats_plain_url):
+    received = []
+
+    with NATSClient(
+        nats_plain_url,
+        socket_timeout=2,
+        socket_rcvbuf=1 << 20,
+        socket_sndbuf=1 << 20,
+        recv_buffer_size=16,
+    ) as client:
+        client.subscribe("test-subject", callback=received.append, max_messages=2)
+        client.publish("test-subject", payload=b"test-payload")
+        client.publish("test-subject", payload=b"test-payload" * 16)
+        client.wait(count=2)
+
+    assert len(received) == 2
+
+    assert received[0].payload == b"test-payload"
+    assert received[1].payload == b"test-payload" * 16
+
+
+def test_connect_with_reader_thread(nats_plain_url):
+    received = []
+
+    with NATSClient(nats_plain_url, socket_timeout=2, reader_thread=True) as client:
+        client.ping()
+
+        sub = client.subscribe("test-subject", callback=received.append)
+        client.publish("test-subject", payload=b"test-payload")
+        client.publish("test-subject", payload=b"test-payload" * 16)
+        client.wait(count=2)
+
+        with pytest.raises(socket.timeout):
+            client.wait(count=1)
+
+        client.unsubscribe(sub)
+        client.ping()
+
+    assert len(received) == 2
+
+    assert received[0].payload == b"test-payload"
+    assert received[1].payload == b"test-payload" * 16
+
+
+def test_reader_thread_tls_not_supported(nats_tls_url):
+    client = NATSClient(nats_tls_url, reader_thread=True)
+
+    with pytest.raises(NATSInvalidSchemeError):
+        client.connect()
+
+
+@pytest.mark.parametrize("reader_thread", [False, True])
+@pytest.mark.parametrize(
+    "frame",
+    [
+        b"MSG test-subject 0 -1\r\n",
+        b"MSG test-subject 0 +1\r\n",
+        b"MSG test-subject 0 1_0\r\n",
+        b"MSG test-subject -0 1\r\n",
+        b"MSG test-subject x 1\r\n",
+    ],
+)
+def test_wait_invalid_message(fake_server, reader_thread, frame):
+    url = fake_server(frame)
+
+    with NATSClient(url, socket_timeout=2, reader_thread=reader_thread) as client:
+        client.subscribe("test-subject", callback=lambda x: x)
+
+        with pytest.raises(NATSInvalidResponse):
+            client.wait(count=1)
+
+
+@pytest.mark.parametrize("reader_thread", [False, True])
+def test_wait_unexpected_response(fake_server, reader_thread):
+    received = []
+
+    url = fake_server(
+        b'INFO {"server_id":"fake"}\r\n',
+        b"UNKNOWN\r\n",
+        b"MSG test-subject 0 12\r\ntest-payload\r\n",
+    )
+
+    with NATSClient(url, socket_timeout=2, reader_thread=reader_thread) as client:
+        client.subscribe("test-subject", callback=received.append)
+
+        with pytest.raises(NATSUnexpectedResponse):
+            client.wait(count=1)
+
+        with pytest.raises(NATSUnexpectedResponse):
+            client.wait(count=1)
+
+        client.wait(count=1)
+
+    assert len(received) == 1
+
+    assert received[0].payload == b"test-payload"
+
+
 def test_connect_timeout():
     client = NATSClient("nats://127.0.0.1:4223", socket_timeout=2)
 
@@ -67,27 +195,65 @@ def test_invalid_scheme():
         client.connect()
 
 
-def test_subscribe_unsubscribe(nats_plain_url):
-    with NATSClient(nats_plain_url, socket_timeout=2) as client:
-        sub = client.subscribe(
-            "test-subject", callback=lambda x: x, queue="test-queue", max_messages=2
-        )
-        client.unsubscribe(sub)
+def test_subscribe_unsubscribe(client):
+    sub = client.subscribe(
+        "test-subject", callback=lambda x: x, queue="test-queue", max_messages=2
+    )
+    client.unsubscribe(sub)
 
 
-def test_subscribe_timeout(nats_plain_url):
-    with NATSClient(nats_plain_url, socket_timeout=2) as client:
-        sub = client.subscribe(
-            "test-subject", callback=lambda x: x, queue="test-queue", max_messages=1
-        )
+def test_subscribe_bytes_subject(client):
+    received = []
+
+    sub = client.subscribe(
+        b"test-subject", callback=received.append, queue=b"test-queue", max_messages=1
+    )
+    client.auto_unsubscribe(sub)
+    client.publish(b"test-subject", payload=b"test-payload")
+    client.wait(count=1)
+
+    assert len(received) == 1
+
+    assert received[0].subject == b"test-subject"
+    assert received[0].payload == b"test-payload"
+
+
+def test_subscribe_timeout(client):
+    sub = client.subscribe(
+        "test-subject", callback=lambda x: x, queue="test-queue", max_messages=1
+    )
+
+    with pytest.raises(socket.timeout):
+        client.wait(count=1)
+
+    client.unsubscribe(sub)
+
+
+@pytest.mark.parametrize("recv_buffer_size", [256 * 1024, 16])
+def test_wait_timeout_inside_message(fake_server, recv_buffer_size):
+    received = []
+
+    # the server stalls before the payload is complete, its bytes must never be
+    # parsed as commands
+    payload = b"PING\r\nMSG evil 0 4\r\nfake\r\n"
+    url = fake_server(b"MSG test-subject 0 %d\r\n" % (len(payload) + 8) + payload)
+
+    with NATSClient(
+        url, socket_timeout=0.5, recv_buffer_size=recv_buffer_size
+    ) as client:
+        client.subscribe("test-subject", callback=received.append)
 
         with pytest.raises(socket.timeout):
             client.wait(count=1)
 
-        client.unsubscribe(sub)
+        with pytest.raises(NATSReadSocketError):
+            client.wait(count=1)
+
+    assert received == []
 
 
-def test_publish(nats_plain_url):
+def test_publish(nats_plain_url, executor):
+    ready = threading.Event()
     received = []
 
     def worker():
@@ -99,12 +265,13 @@ def test_publish(nats_plain_url):
             client.subscribe(
                 "test-subject", callback=callback, queue="test-queue", max_messages=2
             )
+            client.ping()
+            ready.set()
             client.wait(count=2)
 
-    t = threading.Thread(target=worker)
-    t.start()
+    future = executor.submit(worker)
 
-    time.sleep(1)
+    assert ready.wait(5), "worker did not subscribe"
 
     with NATSClient(nats_plain_url, socket_timeout=2) as client:
         # publish without payload
@@ -112,20 +279,154 @@ def test_publish(nats_plain_url):
         # publish with payload
         client.publish("test-subject", payload=b"test-payload")
 
-    t.join()
+    future.result(timeout=10)
 
     assert len(received) == 2
 
-    assert received[0].subject == "test-subject"
-    assert received[0].reply == ""
+    assert received[0].subject == b"test-subject"
+    assert received[0].subject_str == "test-subject"
+    assert received[0].reply == b""
+    assert received[0].reply_str == ""
     assert received[0].payload == b""
 
-    assert received[1].subject == "test-subject"
-    assert received[1].reply == ""
+    assert received[1].subject == b"test-subject"
+    assert received[1].reply == b""
     assert received[1].payload == b"test-payload"
 
 
-def test_request(nats_plain_url):
+def test_publish_pipeline(nats_plain_url, executor):
+    ready = threading.Event()
+    received = []
+
+    def worker():
+        with NATSClient(nats_plain_url, socket_timeout=2) as client:
+
+            def callback(message):
+                received.append(message)
+
+            client.subscribe(
+                "test-subject", callback=callback, queue="test-queue", max_messages=3
+            )
+            client.ping()
+            ready.set()
+            client.wait(count=3)
+
+    future = executor.submit(worker)
+
+    assert ready.wait(5), "worker did not subscribe"
+
+    with NATSClient(nats_plain_url, socket_timeout=2) as client:
+        with client.pipeline():
+            client.publish("test-subject")
+            client.publish("test-subject", payload=b"test-payload")
+            client.publish("test-subject", payload=b"test-payload", reply="test-reply")
+
+    future.result(timeout=10)
+
+    assert len(received) == 3
+
+    assert received[0].payload == b""
+    assert received[1].payload == b"test-payload"
+    assert received[2].payload == b"test-payload"
+    assert received[2].reply == b"test-reply"
+
+
+def test_publish_pipeline_error(client):
+    received = []
+
+    sub = client.subscribe("test-subject", callback=received.append, max_messages=1)
+    client.auto_unsubscribe(sub)
+
+    with pytest.raises(RuntimeError):
+        with client.pipeline():
+            client.publish("test-subject", payload=b"test-discarded")
+            raise RuntimeError()
+
+    client.publish("test-subject", payload=b"test-payload")
+    client.wait(count=1)
+
+    assert len(received) == 1
+
+    assert received[0].payload == b"test-payload"
+
+
+def test_publish_pipeline_error_after_flush(client):
+    received = []
+    payload = b"x" * (70 * 1024)
+
+    sub = client.subscribe("test-subject", callback=received.append, max_messages=2)
+    client.auto_unsubscribe(sub)
+
+    with client.pipeline():
+        client.publish("test-subject", payload=b"test-outer")
+
+        # the inner block crosses the flush threshold before it fails
+        with pytest.raises(RuntimeError):
+            with client.pipeline():
+                client.publish("test-subject", payload=payload)
+                client.publish("test-subject", payload=b"test-discarded")
+                raise RuntimeError()
+
+    client.wait(count=2)
+    client.ping()
+
+    assert len(received) == 2
+
+    assert received[0].payload == b"test-outer"
+    assert received[1].payload == payload
+
+
+def test_close_flushes_pipeline(nats_plain_url, client):
+    received = []
+
+    sub = client.subscribe("test-subject", callback=received.append, max_messages=1)
+    client.auto_unsubscribe(sub)
+    client.ping()
+
+    publisher = NATSClient(nats_plain_url, socket_timeout=2)
+    publisher.connect()
+    with publisher.pipeline():
+        publisher.publish("test-subject", payload=b"test-payload")
+        publisher.close()
+
+    client.wait(count=1)
+
+    assert len(received) == 1
+
+    assert received[0].payload == b"test-payload"
+
+
+def test_publish_many(client):
+    received = []
+
+    sub = client.subscribe("test-subject", callback=received.append, max_messages=2)
+    client.auto_unsubscribe(sub)
+    client.publish_many([("test-subject", b""), (b"test-subject", b"test-payload")])
+    client.wait(count=2)
+
+    assert len(received) == 2
+
+    assert received[0].payload == b""
+    assert received[1].payload == b"test-payload"
+
+
+def test_publish_large_payload(client):
+    received = []
+    payload = bytes(range(256)) * 1024
+
+    sub = client.subscribe("test-subject", callback=received.append, max_messages=1)
+    client.auto_unsubscribe(sub)
+    client.publish("test-subject", payload=payload)
+    client.wait(count=1)
+
+    assert len(received) == 1
+
+    assert received[0].payload == payload
+
+
+def test_request(nats_plain_url, executor):
+    ready = threading.Event()
+
     def worker():
         with NATSClient(nats_plain_url, socket_timeout=2) as client:
 
@@ -135,74 +436,78 @@ def test_request(nats_plain_url):
             client.subscribe(
                 "test-subject", callback=callback, queue="test-queue", max_messages=2
             )
+            client.ping()
+            ready.set()
             client.wait(count=2)
 
-    t = threading.Thread(target=worker)
-    t.start()
+    future = executor.submit(worker)
 
-    time.sleep(1)
+    assert ready.wait(5), "worker did not subscribe"
 
     with NATSClient(nats_plain_url, socket_timeout=2) as client:
         # request without payload
         resp = client.request("test-subject")
-        assert resp.subject.startswith("_INBOX.")
-        assert resp.reply == ""
+        assert resp.subject.startswith(b"_INBOX.")
+        assert resp.reply == b""
         assert resp.payload == b"test-callback-payload"
+        inbox = resp.subject
 
         # request with payload
         resp = client.request("test-subject", payload=b"test-payload")
-        assert resp.subject.startswith("_INBOX.")
-        assert resp.reply == ""
+        assert resp.subject.startswith(b"_INBOX.")
+        assert resp.subject != inbox
+        assert resp.subject.rpartition(b".")[0] == inbox.rpartition(b".")[0]
+        assert resp.reply == b""
         assert resp.payload == b"test-callback-payload"
 
-    t.join()
+    future.result(timeout=10)
+
 
+def test_request_msgpack(nats_plain_url, executor):
+    ready = threading.Event()
 
-def test_request_msgpack(nats_plain_url):
     def worker():
         with NATSClient(nats_plain_url, socket_timeout=2) as client:
 
             def callback(message):
                 client.publish(
-                    message.reply,
-                    payload=msgpack.packb(
-                        {b"v": 3338} if message.payload else {b"v": 32}
-                    ),
+                    message.reply, payload=packed_replies[bool(message.payload)]
                 )
 
             client.subscribe(
                 "test-subject", callback=callback, queue="test-queue", max_messages=2
             )
+            client.ping()
+            ready.set()
             client.wait(count=2)
 
-    t = threading.Thread(target=worker)
-    t.start()
+    future = executor.submit(worker)
 
-    time.sleep(1)
+    assert ready.wait(5), "worker did not subscribe"
 
     with NATSClient(nats_plain_url, socket_timeout=2) as client:
         # request without payload
         resp = client.request("test-subject")
-        assert resp.subject.startswith("_INBOX.")
-        assert resp.reply == ""
+        assert resp.subject.startswith(b"_INBOX.")
+        assert resp.reply == b""
         assert msgpack.unpackb(resp.payload) == {b"v": 32}
 
         # request with payload
-        resp = client.request("test-subject", payload=msgpack.packb("test-payload"))
-        assert resp.subject.startswith("_INBOX.")
-        assert resp.reply == ""
+        resp = client.request("test-subject", payload=packer.pack("test-payload"))
+        assert resp.subject.startswith(b"_INBOX.")
+        assert resp.reply == b""
         assert msgpack.unpackb(resp.payload) == {b"v": 3338}
 
-    t.join()
+    future.result(timeout=10)
 
 
-def test_request_timeout(nats_plain_url):
-    with NATSClient(nats_plain_url, socket_timeout=2) as client:
-        with pytest.raises(socket.timeout):
-            client.request("test-subject")
+def test_request_timeout(client):
+    with pytest.raises(socket.timeout):
+        client.request("test-subject")
 
 
-def test_graceful_shutdown(nats_plain_url):
+@pytest.mark.parametrize("reader_thread", [False, True])
+def test_graceful_shutdown(nats_plain_url, reader_thread):
     def worker(client, connected_event):
         client.connect()
         connected_event.set()
@@ -213,7 +518,7 @@ def test_graceful_shutdown(nats_plain_url):
         except Exception:
             raise AssertionError("unexpected Exception raised")
 
-    client = NATSClient(nats_plain_url)
+    client = NATSClient(nats_plain_url, reader_thread=reader_thread)
     connected_event = threading.Event()
     thread = threading.Thread(target=worker, args=[client, connected_event])
     thread.start()